@@ -68,7 +68,7 @@ def reward(static, tour_indices):
     y = torch.cat((tour, tour[:, :1]), dim=1)
 
     # Euclidean distance between each consecutive point
-    tour_len = torch.sqrt(torch.sum(torch.pow(y[:, :-1] - y[:, 1:], 2), dim=2))
+    tour_len = torch.linalg.vector_norm(torch.diff(y, dim=1), dim=2)
 
     return tour_len.sum(1).detach()
 
@@ -7,6 +7,7 @@ The VRP is defined by the following traits:
 """
 
 import os
+from collections import namedtuple
 import numpy as np
 import torch
 from torch.utils.data import Dataset
@@ -14,11 +15,31 @@ from torch.autograd import Variable
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+
+# A single dataset item; default_collate stacks each field and returns the
+# same namedtuple type, so batches still unpack as (static, dynamic, x0)
+VRPSample = namedtuple('VRPSample', ['static', 'dynamic', 'start_loc'])
 
 
 class VehicleRoutingDataset(Dataset):
+    """Randomly generated VRP instances.
+
+    Parameters
+    ----------
+    device: torch.device or None
+        Where the dataset tensors are generated and stored (default: CPU).
+        Items of a CUDA-built dataset are already on the GPU, so they cannot
+        be loaded with a DataLoader using pin_memory=True
+    dtype: torch.dtype
+        Storage type of the static (x, y) coordinates, e.g. torch.bfloat16.
+        The (load, demand) values always stay float32, as the mask relies on
+        exact comparisons against 0; cast static back to float before use
+    """
+
     def __init__(self, num_samples,input_size, max_load=20, max_demand=9,
-                 seed=None):
+                 seed=None, device=None, dtype=torch.float):
         super(VehicleRoutingDataset, self).__init__()
 
         if max_load < max_demand:
@@ -33,31 +54,42 @@ class VehicleRoutingDataset(Dataset):
         self.max_load = max_load
         self.max_demand = max_demand
 
-        # Depot location will be the first node in each
-        locations = torch.rand((num_samples, 2, input_size + 1))
-        self.static = locations
+        # Depot location will be the first node in each. Coordinates lie in
+        # [0, 1], so they can be stored in a reduced precision `dtype` and
+        # cast back to float on use
+        locations = torch.rand((num_samples, 2, input_size + 1), device=device)
+        self.static = locations.to(dtype)
+        self.device = self.static.device
 
         # All states will broadcast the drivers current load
         # Note that we only use a load between [0, 1] to prevent large
         # numbers entering the neural network
         dynamic_shape = (num_samples, 1, input_size + 1)
-        loads = torch.full(dynamic_shape, 1.)
+        loads = torch.full(dynamic_shape, 1., device=device)
 
         # All states will have their own intrinsic demand in [1, max_demand), 
         # then scaled by the maximum load. E.g. if load=10 and max_demand=30, 
         # demands will be scaled to the range (0, 3)
-        demands = torch.randint(1, max_demand + 1, dynamic_shape,dtype=torch.float)
-        demands = demands / float(max_load)
+        demands = torch.randint(1, max_demand + 1, dynamic_shape,
+                                dtype=torch.float, device=device)
+        demands.div_(float(max_load))
 
         demands[:, 0, 0] = 0  # depot starts with a demand of 0
-        self.dynamic = torch.tensor(np.concatenate((loads, demands), axis=1),dtype=torch.float)
+        self.dynamic = torch.cat((loads, demands), 1)
+
+        # The depot start location is sliced out once, rather than per item
+        self.start_loc = self.static[:, :, 0:1].contiguous()
+
+        # torch.compile mode of the step updates, or None for the uncompiled
+        # ones. Only the mode is kept on the instance so the dataset stays
+        # picklable for multi-worker DataLoaders
+        self._compile_mode = None
 
     def __len__(self):
         return self.num_samples
 
     def __getitem__(self, idx):
-        # (static, dynamic, start_loc)
-        return (self.static[idx], self.dynamic[idx], self.static[idx, :, 0:1])
+        return VRPSample(self.static[idx], self.dynamic[idx], self.start_loc[idx])
 
     def update_mask(self, mask, dynamic, chosen_idx=None):
         """Updates the mask used to hide non-valid states.
@@ -66,73 +98,118 @@ class VehicleRoutingDataset(Dataset):
         ----------
         dynamic: torch.autograd.Variable of size (1, num_feats, seq_len)
         """
+        mask_fn, _ = _update_fns(self._compile_mode)
+        return mask_fn(dynamic.data[:, 0], dynamic.data[:, 1], chosen_idx)
 
-        # Convert floating point to integers for calculations
-        loads = dynamic.data[:, 0]  # (batch_size, seq_len)
-        demands = dynamic.data[:, 1]  # (batch_size, seq_len)
+    def update_dynamic(self, dynamic, chosen_idx):
+        """Updates the (load, demand) dataset values.
 
-        # If there is no positive demand left, we can end the tour.
-        # Note that the first node is the depot, which always has a negative demand
-        if demands.eq(0).all():
-            return demands * 0.
+        The update itself works on separate (batch_size, seq_len) load and
+        demand tensors; they are only packed back into a single
+        (batch_size, 2, seq_len) tensor here because the dynamic encoder
+        consumes them that way.
+        """
+        _, dynamic_fn = _update_fns(self._compile_mode)
+        loads, demands = dynamic_fn(dynamic[:, 0], dynamic[:, 1], chosen_idx)
+        return torch.stack((loads, demands), 1)
+
+    def compile(self, mode='default'):
+        """Compiles update_mask & update_dynamic with torch.compile.
+
+        Both updates run once per decoded node with fixed tensor shapes, so
+        their pointwise ops fuse well. CUDA-graph modes ('reduce-overhead')
+        are not supported: each call would reuse the memory of the previous
+        call's outputs, which DRL4TSP still holds (e.g. saved by the dynamic
+        encoder for backward). Requires PyTorch >= 2.0.
+        """
+        if mode in ('reduce-overhead', 'max-autotune'):
+            raise ValueError('mode=%r captures CUDA graphs, which would '
+                             'overwrite step outputs still in use' % mode)
+        if not hasattr(torch, 'compile'):
+            raise RuntimeError('torch.compile requires PyTorch >= 2.0, found %s'
+                               % torch.__version__)
 
-        # Otherwise, we can choose to go anywhere where demand is > 0
-        new_mask = demands.ne(0) * demands.lt(loads)
+        self._compile_mode = mode
 
-        # We should avoid traveling to the depot back-to-back
-        repeat_home = chosen_idx.ne(0)
 
-        if repeat_home.any():
-            new_mask[repeat_home.nonzero(), 0] = 1.
-        if (1 - repeat_home).any():
-            new_mask[(1 - repeat_home).nonzero(), 0] = 0.
+def _update_mask(loads, demands, chosen_idx):
+    """Computes the VRP mask from (batch_size, seq_len) loads & demands."""
 
-        # ... unless we're waiting for all other samples in a minibatch to finish
-        has_no_load = loads[:, 0].eq(0).float()
-        has_no_demand = demands[:, 1:].sum(1).eq(0).float()
+    # We can choose to go anywhere where demand is > 0
+    new_mask = demands.ne(0) * demands.lt(loads)
 
-        combined = (has_no_load + has_no_demand).gt(0)
-        if combined.any():
-            new_mask[combined.nonzero(), 0] = 1.
-            new_mask[combined.nonzero(), 1:] = 0.
+    # We should avoid traveling to the depot back-to-back
+    repeat_home = chosen_idx.ne(0)
 
-        return new_mask.float()
+    # ... unless we're waiting for all other samples in a minibatch to finish
+    has_no_load = loads[:, 0].eq(0)
+    has_no_demand = demands[:, 1:].sum(1).eq(0)
+    combined = has_no_load | has_no_demand
+
+    new_mask[:, 0] = repeat_home | combined
+    new_mask[:, 1:].masked_fill_(combined.unsqueeze(1), 0)
+
+    # If there is no positive demand left, we can end the tour. Note that the
+    # first node is the depot, which always has a negative demand. Zeroing
+    # the mask with a tensor op keeps this branchless; the decoder stops once
+    # it sees the empty mask
+    new_mask.masked_fill_(demands.eq(0).all(), 0)
+
+    return new_mask.float()
 
-    def update_dynamic(self, dynamic, chosen_idx):
-        """Updates the (load, demand) dataset values."""
 
-        # Update the dynamic elements differently for if we visit depot vs. a city
-        visit = chosen_idx.ne(0)
-        depot = chosen_idx.eq(0)
+def _update_dynamic(loads, demands, chosen_idx):
+    """Returns the new (loads, demands) tensors after visiting chosen_idx."""
 
-        # Clone the dynamic variable so we don't mess up graph
-        all_loads = dynamic[:, 0].clone()
-        all_demands = dynamic[:, 1].clone()
+    # Update the dynamic elements differently for if we visit depot vs. a city
+    visit = chosen_idx.ne(0).unsqueeze(1)
+    depot = chosen_idx.eq(0).unsqueeze(1)
+    chosen = chosen_idx.unsqueeze(1)
 
-        load = torch.gather(all_loads, 1, chosen_idx.unsqueeze(1))
-        demand = torch.gather(all_demands, 1, chosen_idx.unsqueeze(1))
+    load = torch.gather(loads, 1, chosen)
+    demand = torch.gather(demands, 1, chosen)
 
-        # Across the minibatch - if we've chosen to visit a city, try to satisfy
-        # as much demand as possible
-        if visit.any():
+    # Across the minibatch - if we've chosen to visit a city, try to satisfy
+    # as much demand as possible
+    new_load = torch.clamp(load - demand, min=0)
+    new_demand = torch.clamp(demand - load, min=0)
 
-            new_load = torch.clamp(load - demand, min=0)
-            new_demand = torch.clamp(demand - load, min=0)
+    # Broadcast the load to all nodes, but update demand seperately.
+    # Samples returning to the depot refill their vehicle load. All ops are
+    # out-of-place, so the inputs are never modified and need no clone
+    all_loads = torch.where(visit, new_load.expand_as(loads), loads)
+    all_loads = all_loads.masked_fill(depot, 1.)
 
-            # Broadcast the load to all nodes, but update demand seperately
-            visit_idx = visit.nonzero().squeeze()
+    all_demands = demands.scatter(1, chosen, torch.where(visit, new_demand, demand))
+    all_demands[:, 0] = (new_load - 1.).masked_fill(depot, 0.).squeeze(1)
 
-            all_loads[visit_idx] = new_load[visit_idx]
-            all_demands[visit_idx, chosen_idx[visit_idx]] = new_demand[visit_idx].view(-1)
-            all_demands[visit_idx, 0] = -1. + new_load[visit_idx].view(-1)
+    return all_loads, all_demands
 
-        # Return to depot to fill vehicle load
-        if depot.any():
-            all_loads[depot.nonzero().squeeze()] = 1.
-            all_demands[depot.nonzero().squeeze(), 0] = 0.
 
-        tensor = torch.cat((all_loads.unsqueeze(1), all_demands.unsqueeze(1)), 1)
-        return torch.tensor(tensor.data, device=dynamic.device)
+# (mask, dynamic) update functions, keyed by torch.compile mode
+_UPDATE_FNS = {}
+
+
+def _update_fns(compile_mode):
+    """Returns the (mask, dynamic) update functions for a torch.compile mode,
+    compiling them on first use.
+
+    None selects the uncompiled updates. These are called once per decoded
+    node, so on PyTorch 1.x they are scripted to avoid paying Python
+    dispatch for each of their small pointwise ops. On 2.x, where
+    torch.jit.script is deprecated, they run eagerly unless compiled.
+    """
+    if compile_mode is None and None not in _UPDATE_FNS:
+        if hasattr(torch, 'compile'):
+            _UPDATE_FNS[None] = (_update_mask, _update_dynamic)
+        else:
+            _UPDATE_FNS[None] = (torch.jit.script(_update_mask),
+                                 torch.jit.script(_update_dynamic))
+    elif compile_mode not in _UPDATE_FNS:
+        _UPDATE_FNS[compile_mode] = (
+            torch.compile(_update_mask, mode=compile_mode, fullgraph=True),
+            torch.compile(_update_dynamic, mode=compile_mode, fullgraph=True))
+    return _UPDATE_FNS[compile_mode]
 
 
 def reward(static, tour_indices):
@@ -151,7 +228,7 @@ def reward(static, tour_indices):
     y = torch.cat((start, tour, start), dim=1)
 
     # Euclidean distance between each consecutive point
-    tour_len = torch.sqrt(torch.sum(torch.pow(y[:, :-1] - y[:, 1:], 2), dim=2))
+    tour_len = torch.linalg.vector_norm(torch.diff(y, dim=1), dim=2)
 
     return tour_len.sum(1)
 
@@ -184,10 +261,12 @@ def render(static, tour_indices, save_path):
         x = np.hstack((start[0], data[0], start[0]))
         y = np.hstack((start[1], data[1], start[1]))
 
-        # Assign each subtour a different colour & label in order traveled
+        # Assign each subtour a different colour in order traveled, and draw
+        # them all as a single collection rather than one artist per subtour
         idx = np.hstack((0, tour_indices[i].cpu().numpy().flatten(), 0))
         where = np.where(idx == 0)[0]
 
+        segments, colors = [], []
         for j in range(len(where) - 1):
 
             low = where[j]
@@ -196,9 +275,10 @@ def render(static, tour_indices, save_path):
             if low + 1 == high:
                 continue
 
-            ax.plot(x[low: high + 1], y[low: high + 1], zorder=1, label=j)
+            segments.append(np.column_stack((x[low: high + 1], y[low: high + 1])))
+            colors.append('C%d' % (len(colors) % 10))
 
-        ax.legend(loc="upper right", fontsize=3, framealpha=0.5)
+        ax.add_collection(LineCollection(segments, colors=colors, zorder=1))
         ax.scatter(x, y, s=4, c='r', zorder=2)
         ax.scatter(x[0], y[0], s=20, c='k', marker='*', zorder=3)
 
@@ -24,6 +24,14 @@ device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 #device = torch.device('cpu')
 
 
+def use_pin_memory(dataset):
+    """Pinned batches let the host-to-device copies in train/validate run
+    async, but only CPU tensors can be pinned; datasets built directly on
+    the GPU are loaded without it."""
+    data_device = getattr(dataset, 'device', torch.device('cpu'))
+    return device.type == 'cuda' and data_device.type == 'cpu'
+
+
 class StateCritic(nn.Module):
     """Estimates the problem complexity.
 
@@ -101,9 +109,9 @@ def validate(data_loader, actor, reward_fn, render_fn=None, save_dir='.',
 
         static, dynamic, x0 = batch
 
-        static = static.to(device)
-        dynamic = dynamic.to(device)
-        x0 = x0.to(device) if len(x0) > 0 else None
+        static = static.to(device, torch.float, non_blocking=True)
+        dynamic = dynamic.to(device, non_blocking=True)
+        x0 = x0.to(device, torch.float, non_blocking=True) if len(x0) > 0 else None
 
         with torch.no_grad():
             tour_indices, _ = actor.forward(static, dynamic, x0)
@@ -136,8 +144,10 @@ def train(actor, critic, task, num_nodes, train_data, valid_data, reward_fn,
     actor_optim = optim.Adam(actor.parameters(), lr=actor_lr)
     critic_optim = optim.Adam(critic.parameters(), lr=critic_lr)
 
-    train_loader = DataLoader(train_data, batch_size, True, num_workers=0)
-    valid_loader = DataLoader(valid_data, batch_size, False, num_workers=0)
+    train_loader = DataLoader(train_data, batch_size, True, num_workers=0,
+                              pin_memory=use_pin_memory(train_data))
+    valid_loader = DataLoader(valid_data, batch_size, False, num_workers=0,
+                              pin_memory=use_pin_memory(valid_data))
 
     best_params = None
     best_reward = np.inf
@@ -156,9 +166,9 @@ def train(actor, critic, task, num_nodes, train_data, valid_data, reward_fn,
 
             static, dynamic, x0 = batch
 
-            static = static.to(device)
-            dynamic = dynamic.to(device)
-            x0 = x0.to(device) if len(x0) > 0 else None
+            static = static.to(device, torch.float, non_blocking=True)
+            dynamic = dynamic.to(device, non_blocking=True)
+            x0 = x0.to(device, torch.float, non_blocking=True) if len(x0) > 0 else None
 
 
             # Full forward pass through the dataset
@@ -286,7 +296,8 @@ def train_tsp(args):
     test_data = TSPDataset(args.num_nodes, args.train_size, args.seed + 2)
 
     test_dir = 'test'
-    test_loader = DataLoader(test_data, args.batch_size, False, num_workers=0)
+    test_loader = DataLoader(test_data, args.batch_size, False, num_workers=0,
+                             pin_memory=use_pin_memory(test_data))
     out = validate(test_loader, actor, tsp.reward, tsp.render, test_dir, num_plot=5)
 
     print('Average tour length: ', out)
@@ -311,17 +322,26 @@ def train_vrp(args):
 
     max_load = LOAD_DICT[args.num_nodes]
 
+    # Optionally build the datasets directly on the GPU / in reduced precision
+    data_kwargs = {'device': device if args.data_on_device else None,
+                   'dtype': getattr(torch, args.static_dtype)}
+
     train_data = VehicleRoutingDataset(args.train_size,
                                        args.num_nodes,
                                        max_load,
                                        MAX_DEMAND,
-                                       args.seed)
+                                       args.seed,
+                                       **data_kwargs)
 
     valid_data = VehicleRoutingDataset(args.valid_size,
                                        args.num_nodes,
                                        max_load,
                                        MAX_DEMAND,
-                                       args.seed + 1)
+                                       args.seed + 1,
+                                       **data_kwargs)
+
+    if args.compile:
+        train_data.compile()
 
     actor = DRL4TSP(STATIC_SIZE,
                     DYNAMIC_SIZE,
@@ -353,10 +373,12 @@ def train_vrp(args):
                                       args.num_nodes,
                                       max_load,
                                       MAX_DEMAND,
-                                      args.seed + 2)
+                                      args.seed + 2,
+                                      **data_kwargs)
 
     test_dir = 'test'
-    test_loader = DataLoader(test_data, args.batch_size, False, num_workers=0)
+    test_loader = DataLoader(test_data, args.batch_size, False, num_workers=0,
+                             pin_memory=use_pin_memory(test_data))
     out = validate(test_loader, actor, vrp.reward, vrp.render, test_dir, num_plot=5)
 
     print('Average tour length: ', out)
@@ -379,6 +401,15 @@ if __name__ == '__main__':
     parser.add_argument('--layers', dest='num_layers', default=1, type=int)
     parser.add_argument('--train-size',default=1000000, type=int)
     parser.add_argument('--valid-size', default=1000, type=int)
+    parser.add_argument('--compile', action='store_true', default=False,
+                        help='torch.compile the VRP step updates (VRP only, '
+                             'requires PyTorch >= 2.0)')
+    parser.add_argument('--data-on-device', action='store_true', default=False,
+                        help='build the VRP datasets directly on the training '
+                             'device (disables pinned memory)')
+    parser.add_argument('--static-dtype', default='float32',
+                        choices=['float32', 'float16', 'bfloat16'],
+                        help='storage type of the VRP (x, y) coordinates')
 
     args = parser.parse_args()
 
@@ -386,6 +417,13 @@ if __name__ == '__main__':
     #args.checkpoint = os.path.join('vrp', '10', '12_59_47.350165' + os.path.sep)
     #print(args.checkpoint)
 
+    if args.task != 'vrp':
+        if args.compile:
+            raise ValueError('--compile is only supported for --task=vrp')
+        if args.data_on_device or args.static_dtype != 'float32':
+            raise ValueError('--data-on-device and --static-dtype are only '
+                             'supported for --task=vrp')
+
     if args.task == 'tsp':
         train_tsp(args)
     elif args.task == 'vrp':